@@ -1,5 +1,2 @@
-purity_state_mapping = {
-    100: 110,
-    110: 111,
-    111: 100,
-}
+# Purity masks the filter key cycles through, starting from sfw only.
+PURITY_CYCLE = (100, 110, 111)
@@ -1,34 +1,131 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Awaitable, Callable, TypeVar
+import asyncio
 import os
+import select
+import socket
+import sqlite3
 import subprocess
 import sys
-from urllib.parse import urlparse
+import threading
+import time
+from weakref import WeakValueDictionary
 
-import requests
+import aiofiles
+import httpx
+import orjson
 from dotenv import load_dotenv
+from PIL import Image as PILImage
 from textual import events, work
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
-from textual.widgets import Footer, Header, Input, Label, ListItem, ListView, Static
+from textual.timer import Timer
+from textual.widgets import Footer, Header, Input, OptionList, Static
+from textual.widgets.option_list import Option
 from textual_image.widget import Image
 
+from constants import PURITY_CYCLE
+
+if sys.platform == "darwin":
+    try:
+        from AppKit import NSScreen, NSWorkspace
+        from Foundation import NSURL
+    except ImportError:
+        NSWorkspace = None
+else:
+    NSWorkspace = None
+
 
 BASE_URL = "https://wallhaven.cc/api/v1"
+WALLHAVEN_HOSTS = ("wallhaven.cc", "w.wallhaven.cc", "th.wallhaven.cc")
 CACHE_ROOT = Path.home() / ".cache" / "walls"
 THUMB_DIR = CACHE_ROOT / "thumbs"
 FULL_DIR = CACHE_ROOT / "full"
+INDEX_PATH = CACHE_ROOT / "index.db"
 ASCII_GRADIENT = " .:-=+*#%@"
+# Order of the flags in Wallhaven's three-digit purity mask, e.g. 110.
+PURITY_LEVELS = ("sfw", "sketchy", "nsfw")
+# Result row: id, resolution, category, purity.
+LABEL_TEMPLATE = "%s • %s • %s • %s"
+SEARCH_TIMEOUT = 15.0
+DOWNLOAD_TIMEOUT = 20.0
+MAX_CONCURRENT_DOWNLOADS = 8
+# Prefetches may hold at most this many download slots, leaving the rest
+# free for previews the user is actually waiting on.
+MAX_CONCURRENT_PREFETCHES = 4
+PREFETCH_WINDOW = 8
+PREFETCH_LOOKAHEAD = 2
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# A side file untouched for this long is abandoned even if its pid is in use,
+# since pids get reused.
+STALE_PARTIAL_AGE = 60 * 60
+MAX_CONNECTIONS = 16
+MAX_KEEPALIVE_CONNECTIONS = 8
+KEEPALIVE_TIMEOUT = 30
+REQUEST_RETRIES = 2
+RETRY_BACKOFF = 0.3
+OSASCRIPT_TIMEOUT = 10.0
+# Compiled once per osascript process; each wallpaper change then only sends a
+# one-line setWall("...") call.
+SET_WALLPAPER_HANDLER = (
+    "on setWall(p)",
+    'tell application "System Events" to tell every desktop '
+    "to set picture to POSIX file p",
+    "end setWall",
+)
+PREVIEW_DEBOUNCE = 0.12
+# How long the user must stay on a row before the larger thumbnail loads.
+LARGE_PREVIEW_DWELL = 0.5
+CACHE_PAGE_SIZE = 500
+SEARCH_PAGE_CACHE_SIZE = 32
+THUMB_CACHE_LIMIT = 200 * 1024 * 1024
+FULL_CACHE_LIMIT = 2 * 1024 * 1024 * 1024
+# Decoding happens off the event loop so the next download can start meanwhile.
+IMAGE_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallpapers (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    resolution TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL DEFAULT '',
+    purity TEXT NOT NULL DEFAULT '',
+    file_type TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS wallpapers_by_mtime ON wallpapers (mtime);
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
 
 
 class WallhavenError(RuntimeError):
     """Errors raised when the Wallhaven API fails."""
 
 
-@dataclass(frozen=True)
+T = TypeVar("T")
+
+
+async def _with_retries(request: Callable[[], Awaitable[T]]) -> T:
+    # Only connection-level failures are retried; HTTP error statuses are not.
+    for attempt in range(REQUEST_RETRIES):
+        try:
+            return await request()
+        except (httpx.NetworkError, httpx.RemoteProtocolError):
+            await asyncio.sleep(RETRY_BACKOFF * 2**attempt)
+    return await request()
+
+
+@dataclass(frozen=True, slots=True)
 class Wallpaper:
     identifier: str
     thumb_url: str
@@ -37,90 +134,551 @@ class Wallpaper:
     category: str
     purity: str
     file_type: str
+    large_thumb_url: str = ""
+    # Lazily formatted strings. cached_property needs an instance __dict__,
+    # which slots remove, so these are filled in by the properties below.
+    _label: str | None = field(default=None, init=False, repr=False, compare=False)
+    _details: str | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def label(self) -> str:
+        if self._label is None:
+            object.__setattr__(
+                self,
+                "_label",
+                LABEL_TEMPLATE
+                % (self.identifier, self.resolution, self.category, self.purity),
+            )
+        return self._label
+
+    @property
+    def details(self) -> str:
+        if self._details is None:
+            object.__setattr__(self, "_details", format_details(self))
+        return self._details
+
+
+# (id, path, resolution, category, purity, file_type) row from the cache index.
+CachedEntry = tuple[str, str, str, str, str, str]
+# Results and meta of one fetched search page.
+SearchPage = tuple[list[Wallpaper], dict[str, Any]]
 
 
 class WallhavenClient:
     def __init__(self, api_key: str | None) -> None:
         self.api_key = api_key
-        self.session = requests.Session()
-        if api_key:
-            self.session.headers.update({"X-API-Key": api_key})
+        self.headers = {"X-API-Key": api_key} if api_key else {}
 
-    def search(
+    async def search(
         self,
+        session: httpx.AsyncClient,
         query: str,
         purity: int,
         page: int = 1,
     ) -> tuple[list[Wallpaper], dict[str, Any]]:
         params = {"q": query, "page": page, "purity": purity}
         try:
-            response = self.session.get(f"{BASE_URL}/search", params=params, timeout=15)
-        except requests.RequestException as exc:
-            raise WallhavenError(f"Request failed: {exc}") from exc
-
-        if response.status_code == 401:
-            raise WallhavenError("Unauthorized. Check WALLHAVEN_API_KEY.")
-        if response.status_code == 429:
-            raise WallhavenError("Rate limit reached. Try again later.")
-
-        try:
-            response.raise_for_status()
-        except requests.HTTPError as exc:
+            payload = await _with_retries(lambda: self._fetch_search(session, params))
+        except orjson.JSONDecodeError as exc:
+            raise WallhavenError(f"Invalid API response: {exc}") from exc
+        except httpx.HTTPStatusError as exc:
             raise WallhavenError(f"API error: {exc}") from exc
+        except httpx.HTTPError as exc:
+            raise WallhavenError(f"Request failed: {exc}") from exc
 
-        payload = response.json()
         results = [self._parse_wallpaper(item) for item in payload.get("data", [])]
         meta = payload.get("meta", {})
         return results, meta
 
+    async def _fetch_search(
+        self, session: httpx.AsyncClient, params: dict[str, Any]
+    ) -> dict[str, Any]:
+        response = await session.get(
+            f"{BASE_URL}/search",
+            params=params,
+            headers=self.headers,
+            timeout=SEARCH_TIMEOUT,
+        )
+        if response.status_code != 200:
+            if response.status_code == 401:
+                raise WallhavenError("Unauthorized. Check WALLHAVEN_API_KEY.")
+            if response.status_code == 429:
+                raise WallhavenError("Rate limit reached. Try again later.")
+            response.raise_for_status()
+        return orjson.loads(response.content)
+
     @staticmethod
     def _parse_wallpaper(item: dict[str, Any]) -> Wallpaper:
         thumbs = item.get("thumbs", {})
-        thumb_url = thumbs.get("small") or thumbs.get("large") or ""
+        large_thumb_url = thumbs.get("large") or thumbs.get("original") or ""
+        thumb_url = thumbs.get("small") or large_thumb_url
         return Wallpaper(
             identifier=item.get("id", ""),
             thumb_url=thumb_url,
+            large_thumb_url=large_thumb_url,
             full_url=item.get("path", ""),
             resolution=item.get("resolution", ""),
-            category=item.get("category", ""),
-            purity=item.get("purity", ""),
-            file_type=item.get("file_type", ""),
+            # These come from a tiny vocabulary; interning shares one string
+            # per value across every page instead of one per result.
+            category=sys.intern(item.get("category", "")),
+            purity=sys.intern(item.get("purity", "")),
+            file_type=sys.intern(item.get("file_type", "")),
         )
 
 
+def _is_cached(path: Path) -> bool:
+    try:
+        return os.stat(path).st_size > 0
+    except FileNotFoundError:
+        return False
+
+
+def _decode_image(path: Path) -> PILImage.Image:
+    try:
+        image = PILImage.open(path)
+        image.load()
+    except OSError as exc:
+        raise WallhavenError(f"Preview decode failed: {exc}") from exc
+    return image
+
+
+def _purity_flags(mask: int) -> dict[str, bool]:
+    return {
+        level: flag == "1" for level, flag in zip(PURITY_LEVELS, f"{mask:03d}")
+    }
+
+
+def _purity_matches(purity: str, mask: int) -> bool:
+    return _purity_flags(mask).get(purity, True)
+
+
+def _purity_narrows(new_mask: int, old_mask: int) -> bool:
+    old_flags = _purity_flags(old_mask)
+    return all(old_flags[level] for level, on in _purity_flags(new_mask).items() if on)
+
+
+@lru_cache(maxsize=4096)
+def _suffix_for_url(url: str) -> str:
+    path = url.partition("?")[0].partition("#")[0]
+    dot = path.rfind(".", path.rfind("/") + 1)
+    if dot == -1 or not 1 < len(path) - dot <= 5:
+        return ".jpg"
+    return path[dot:]
+
+
+def _partial_owner_alive(name: str) -> bool:
+    # Side files are named "<file>.<pid>.part" by CacheManager.download().
+    try:
+        os.kill(int(name.rsplit(".", 2)[-2]), 0)
+    except (ValueError, IndexError, ProcessLookupError):
+        return False
+    except PermissionError:
+        # Running, but owned by another user.
+        return True
+    return True
+
+
+_cache_dirs_ready = False
+
+
+def _ensure_cache_dirs() -> None:
+    global _cache_dirs_ready
+    if _cache_dirs_ready:
+        return
+    THUMB_DIR.mkdir(parents=True, exist_ok=True)
+    FULL_DIR.mkdir(parents=True, exist_ok=True)
+    _cache_dirs_ready = True
+
+
 class CacheManager:
     def __init__(self) -> None:
-        THUMB_DIR.mkdir(parents=True, exist_ok=True)
-        FULL_DIR.mkdir(parents=True, exist_ok=True)
+        self._download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        self._prefetch_slots = asyncio.Semaphore(MAX_CONCURRENT_PREFETCHES)
+        # Files known to be on disk, so lookups skip the stat call.
+        self._present = self._scan_present(THUMB_DIR) | self._scan_present(FULL_DIR)
+        self._url_locks: WeakValueDictionary[str, asyncio.Lock] = (
+            WeakValueDictionary()
+        )
+        self._thumbnail_paths: dict[str, Path] = {}
+        self._large_thumbnail_paths: dict[str, Path] = {}
+        self._full_paths: dict[str, Path] = {}
+        try:
+            self._db = sqlite3.connect(INDEX_PATH)
+        except sqlite3.OperationalError:
+            # First run: the cache root does not exist yet.
+            CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(INDEX_PATH)
+        self._db.executescript(INDEX_SCHEMA)
+        self._normalize_file_types()
+        self.reconcile()
+
+    def _normalize_file_types(self) -> None:
+        # file_type holds the file suffix, as reconcile() finds it on disk;
+        # older rows from download_full() stored the API's MIME type instead.
+        rows = self._db.execute(
+            "SELECT id, path FROM wallpapers WHERE file_type LIKE '%/%'"
+        ).fetchall()
+        if rows:
+            with self._db:
+                self._db.executemany(
+                    "UPDATE wallpapers SET file_type = ? WHERE id = ?",
+                    [(Path(path).suffix, identifier) for identifier, path in rows],
+                )
+
+    @staticmethod
+    def _scan_present(directory: Path) -> set[Path]:
+        # Same test as _is_cached: caches written before downloads were
+        # renamed into place can still hold empty files, which must be fetched
+        # again rather than trusted.
+        try:
+            with os.scandir(directory) as entries:
+                return {
+                    Path(entry.path)
+                    for entry in entries
+                    if entry.is_file()
+                    and not entry.name.endswith(".part")
+                    and entry.stat().st_size > 0
+                }
+        except FileNotFoundError:
+            return set()
 
     def thumbnail_path(self, wallpaper: Wallpaper) -> Path:
-        return self._path_for_url(wallpaper.thumb_url, THUMB_DIR, wallpaper.identifier)
+        path = self._thumbnail_paths.get(wallpaper.identifier)
+        if path is None:
+            path = self._path_for_url(
+                wallpaper.thumb_url, THUMB_DIR, wallpaper.identifier
+            )
+            self._thumbnail_paths[wallpaper.identifier] = path
+        return path
+
+    def large_thumbnail_path(self, wallpaper: Wallpaper) -> Path:
+        path = self._large_thumbnail_paths.get(wallpaper.identifier)
+        if path is None:
+            path = self._path_for_url(
+                wallpaper.large_thumb_url, THUMB_DIR, f"{wallpaper.identifier}.large"
+            )
+            self._large_thumbnail_paths[wallpaper.identifier] = path
+        return path
 
     def full_path(self, wallpaper: Wallpaper) -> Path:
-        return self._path_for_url(wallpaper.full_url, FULL_DIR, wallpaper.identifier)
+        path = self._full_paths.get(wallpaper.identifier)
+        if path is None:
+            path = self._path_for_url(
+                wallpaper.full_url, FULL_DIR, wallpaper.identifier
+            )
+            self._full_paths[wallpaper.identifier] = path
+        return path
 
     @staticmethod
     def _path_for_url(url: str, directory: Path, identifier: str) -> Path:
-        suffix = Path(urlparse(url).path).suffix or ".jpg"
-        return directory / f"{identifier}{suffix}"
+        return directory / f"{identifier}{_suffix_for_url(url)}"
+
+    def is_cached(self, path: Path) -> bool:
+        if path in self._present:
+            return True
+        if _is_cached(path):
+            self._present.add(path)
+            return True
+        return False
+
+    def cached_thumbnail(
+        self, wallpaper: Wallpaper, large: bool = False
+    ) -> Path | None:
+        if large:
+            path = self.large_thumbnail_path(wallpaper)
+        else:
+            path = self.thumbnail_path(wallpaper)
+        return path if self.is_cached(path) else None
 
-    def download(self, url: str, destination: Path) -> Path:
-        if destination.exists() and destination.stat().st_size > 0:
+    async def download(
+        self, session: httpx.AsyncClient, url: str, destination: Path
+    ) -> Path:
+        if self.is_cached(destination):
             return destination
 
-        try:
-            response = requests.get(url, stream=True, timeout=20)
-            response.raise_for_status()
-            with destination.open("wb") as file_handle:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        file_handle.write(chunk)
-        except Exception as exc:
-            if destination.exists():
-                destination.unlink(missing_ok=True)
-            raise WallhavenError(f"Download failed: {exc}") from exc
+        # Concurrent requests for the same URL (e.g. a prefetch racing the
+        # preview) share one fetch instead of downloading it twice.
+        lock = self._url_locks.get(url)
+        if lock is None:
+            lock = self._url_locks[url] = asyncio.Lock()
+        async with lock:
+            if self.is_cached(destination):
+                return destination
+
+            # Cache directories are created on the first download rather than
+            # at startup. Write to a side file and rename it into place, so
+            # readers never see a partially written image.
+            _ensure_cache_dirs()
+            partial = destination.with_name(f"{destination.name}.{os.getpid()}.part")
+            async with self._download_slots:
+                try:
+                    await _with_retries(lambda: self._fetch(session, url, partial))
+                    os.replace(partial, destination)
+                except asyncio.CancelledError:
+                    partial.unlink(missing_ok=True)
+                    raise
+                except Exception as exc:
+                    partial.unlink(missing_ok=True)
+                    raise WallhavenError(f"Download failed: {exc}") from exc
+        self._present.add(destination)
         return destination
 
+    async def prefetch(
+        self, session: httpx.AsyncClient, url: str, destination: Path
+    ) -> Path:
+        async with self._prefetch_slots:
+            return await self.download(session, url, destination)
+
+    @staticmethod
+    async def _fetch(
+        session: httpx.AsyncClient, url: str, destination: Path
+    ) -> None:
+        async with session.stream("GET", url, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            chunks = response.aiter_bytes(DOWNLOAD_CHUNK_SIZE)
+            async with aiofiles.open(destination, "wb") as file_handle:
+                async for chunk in chunks:
+                    await file_handle.write(chunk)
+
+    async def download_full(
+        self, session: httpx.AsyncClient, wallpaper: Wallpaper
+    ) -> Path:
+        destination = self.full_path(wallpaper)
+        path = await self.download(session, wallpaper.full_url, destination)
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            # Deleted since it was recorded in the present set; fetch it again.
+            self._present.discard(path)
+            path = await self.download(session, wallpaper.full_url, destination)
+            mtime = path.stat().st_mtime
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO wallpapers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    wallpaper.identifier,
+                    str(path),
+                    mtime,
+                    wallpaper.resolution,
+                    wallpaper.category,
+                    wallpaper.purity,
+                    path.suffix,
+                ),
+            )
+        return path
+
+    def cached_entries(self, limit: int = -1, offset: int = 0) -> list[CachedEntry]:
+        return self._db.execute(
+            "SELECT id, path, resolution, category, purity, file_type "
+            "FROM wallpapers ORDER BY mtime DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        ).fetchall()
+
+    def cached_count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM wallpapers").fetchone()[0]
+
+    @staticmethod
+    def cached_wallpaper(entry: CachedEntry) -> Wallpaper:
+        identifier, path, resolution, category, purity, file_type = entry
+        return Wallpaper(
+            identifier=identifier,
+            thumb_url=path,
+            full_url=path,
+            resolution=resolution,
+            category=category,
+            purity=purity,
+            file_type=file_type,
+        )
+
+    def reconcile(self) -> None:
+        # A directory's mtime only changes when entries are added or removed,
+        # so an unchanged FULL_DIR needs no scan at all.
+        try:
+            dir_mtime = FULL_DIR.stat().st_mtime
+        except FileNotFoundError:
+            # Nothing downloaded yet, or the cache was removed wholesale.
+            with self._db:
+                self._db.execute("DELETE FROM wallpapers")
+                self._db.execute("DELETE FROM index_state")
+            return
+        row = self._db.execute(
+            "SELECT value FROM index_state WHERE key = 'full_dir_mtime'"
+        ).fetchone()
+        if row is not None and row[0] == dir_mtime:
+            return
+
+        indexed = {
+            identifier
+            for (identifier,) in self._db.execute("SELECT id FROM wallpapers")
+        }
+        present = set()
+        added = []
+        with os.scandir(FULL_DIR) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.endswith(".part"):
+                    continue
+                file_path = Path(entry.path)
+                identifier = file_path.stem
+                present.add(identifier)
+                if identifier in indexed:
+                    continue
+                added.append(
+                    (
+                        identifier,
+                        entry.path,
+                        entry.stat().st_mtime,
+                        "cached",
+                        "sfw",
+                        file_path.suffix,
+                    )
+                )
+
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO wallpapers "
+                "(id, path, mtime, category, purity, file_type) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                added,
+            )
+            self._db.executemany(
+                "DELETE FROM wallpapers WHERE id = ?",
+                [(identifier,) for identifier in indexed - present],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO index_state VALUES ('full_dir_mtime', ?)",
+                (dir_mtime,),
+            )
+
+    def trim(
+        self,
+        max_thumb_bytes: int = THUMB_CACHE_LIMIT,
+        max_full_bytes: int = FULL_CACHE_LIMIT,
+    ) -> list[Path]:
+        # Filesystem only, so it is safe to run on a worker thread; pass the
+        # result to forget() on the event loop afterwards.
+        evicted = self._evict(THUMB_DIR, max_thumb_bytes)
+        evicted += self._evict(FULL_DIR, max_full_bytes)
+        return evicted
+
+    def forget(self, paths: list[Path]) -> None:
+        self._present.difference_update(paths)
+        with self._db:
+            self._db.executemany(
+                "DELETE FROM wallpapers WHERE path = ?",
+                [(str(path),) for path in paths],
+            )
+
+    @staticmethod
+    def _evict(directory: Path, max_bytes: int) -> list[Path]:
+        stale_before = time.time() - STALE_PARTIAL_AGE
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    if not entry.name.endswith(".part"):
+                        files.append((entry.path, stat))
+                    elif (
+                        not _partial_owner_alive(entry.name)
+                        or stat.st_mtime < stale_before
+                    ):
+                        # Left behind by a killed process.
+                        Path(entry.path).unlink(missing_ok=True)
+        except FileNotFoundError:
+            return []
+        total = sum(stat.st_size for _, stat in files)
+        evicted = []
+        # Least recently accessed first.
+        for path, stat in sorted(files, key=lambda item: item[1].st_atime):
+            if total <= max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            total -= stat.st_size
+            evicted.append(Path(path))
+        return evicted
+
+
+class OsascriptSession:
+    """A long-lived ``osascript -i`` process reused across wallpaper changes."""
+
+    SENTINEL = "walls-osascript-done"
+
+    def __init__(self, prelude: tuple[str, ...] = ()) -> None:
+        # Script lines (e.g. handler definitions) loaded into every new
+        # process before the first statement runs.
+        self.prelude = prelude
+        self._process: subprocess.Popen[bytes] | None = None
+        self._interactive = True
+        self._lock = threading.Lock()
+
+    def run(self, statement: str) -> None:
+        with self._lock:
+            try:
+                if not self._interactive:
+                    raise WallhavenError("osascript co-process disabled.")
+                output = self._run_interactive(statement)
+            except (OSError, WallhavenError):
+                # Fall back to one-shot processes for good once the co-process
+                # misbehaves, rather than waiting out a timeout on every call.
+                self._interactive = False
+                self._close()
+                command = ["osascript"]
+                for line in (*self.prelude, statement):
+                    command += ["-e", line]
+                subprocess.run(command, check=True)
+                return
+        if "execution error" in output or "syntax error" in output:
+            raise WallhavenError(output.strip())
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _run_interactive(self, statement: str) -> str:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                ["osascript", "-i"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            if self.prelude:
+                output = self._send("\n".join(self.prelude))
+                if "error" in output:
+                    raise WallhavenError(output.strip())
+        return self._send(statement)
+
+    def _send(self, statement: str) -> str:
+        process = self._process
+        assert process is not None
+        assert process.stdin is not None and process.stdout is not None
+        process.stdin.write(f'{statement}\n"{self.SENTINEL}"\n'.encode())
+        process.stdin.flush()
+
+        output = b""
+        sentinel = self.SENTINEL.encode()
+        deadline = time.monotonic() + OSASCRIPT_TIMEOUT
+        descriptor = process.stdout.fileno()
+        while sentinel not in output:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([descriptor], [], [], remaining)[0]:
+                raise WallhavenError("osascript did not respond.")
+            chunk = os.read(descriptor, 4096)
+            if not chunk:
+                raise WallhavenError("osascript exited unexpectedly.")
+            output += chunk
+        return output.partition(sentinel)[0].decode(errors="replace")
+
+    def _close(self) -> None:
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
 
 def format_details(wallpaper: Wallpaper) -> str:
     lines = [
@@ -134,16 +692,6 @@ def format_details(wallpaper: Wallpaper) -> str:
     return "\n".join(lines)
 
 
-class WallItem(ListItem):
-    def __init__(self, wallpaper: Wallpaper) -> None:
-        label = Label(
-            f"{wallpaper.identifier} • {wallpaper.resolution} • "
-            f"{wallpaper.category} • {wallpaper.purity}"
-        )
-        super().__init__(label)
-        self.wallpaper = wallpaper
-
-
 class WallsApp(App):
     CSS = """
     Screen {
@@ -215,7 +763,7 @@ class WallsApp(App):
         ("right", "next_page_or_cache", "Next"),
         ("left", "previous_page_or_cache", "Previous"),
         ("c", "toggle_cache_mode", "Cache mode"),
-        ("x", "nsfw_filter", "NSFW_FILTER"),
+        ("x", "purity", "NSFW_FILTER"),
     ]
 
     TITLE = "Walls"
@@ -224,13 +772,33 @@ class WallsApp(App):
         super().__init__()
         self.client = client
         self.cache = cache
+        self.session: httpx.AsyncClient | None = None
+        self.osascript = OsascriptSession(SET_WALLPAPER_HANDLER)
+        self._wallpaper_token = object()
+        self._wallpaper_lock = threading.Lock()
         self.search_query = ""
         self.current_page = 1
         self.last_page = 1
-        self.purity = 100  # default sfw
+        self.purity_index = 0
+        self.purity = PURITY_CYCLE[self.purity_index]  # default sfw
         self.results: list[Wallpaper] = []
+        # Option id -> position in self.results. Option messages arrive after
+        # a delay, so they are resolved by id rather than by their index.
+        self._result_index: dict[str, int] = {}
+        self.page_results: list[Wallpaper] = []
+        self.page_purity = self.purity
+        # True while the list shows a page filtered locally by action_purity.
+        self.filtered_view = False
+        self._page_cache: OrderedDict[tuple[str, int, int], SearchPage] = (
+            OrderedDict()
+        )
+        self._pending_highlight: Wallpaper | None = None
+        self._preview_timer: Timer | None = None
+        self._trimming = False
+        self._trim_again = False
         self.cache_mode = False
-        self.cached_wallpapers: list[Wallpaper] = []
+        self.cached_entries: list[CachedEntry] = []
+        self.cached_total = 0
         self.current_cache_index = 0
 
     def compose(self) -> ComposeResult:
@@ -238,7 +806,9 @@ class WallsApp(App):
         with Vertical(id="body"):
             yield Input(placeholder="Search Wallhaven...", id="query")
             with Horizontal(id="content"):
-                yield ListView(id="results")
+                # OptionList only renders the rows in view, unlike a ListView
+                # which mounts a widget per result.
+                yield OptionList(id="results")
                 with Vertical(id="preview-pane"):
                     yield Image(id="preview-text")
                     yield Static("", id="details")
@@ -249,20 +819,40 @@ class WallsApp(App):
         yield Footer()
 
     def on_mount(self) -> None:
+        # HTTP/2 multiplexes concurrent thumbnail fetches over one connection
+        # per host instead of queueing them behind a handful of sockets.
+        self.session = httpx.AsyncClient(
+            http2=True,
+            headers={"Accept-Encoding": "gzip, deflate"},
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_TIMEOUT,
+            ),
+        )
         self.query_one("#query", Input).focus()
         self.query_one("#cache-content").display = False
         message = "Enter a search term and press Enter."
         if not self.client.api_key:
             message += " No API key detected; NSFW results unavailable."
         self.update_status(message)
+        self.trim_cache()
+
+    async def on_unmount(self) -> None:
+        if self.session is not None:
+            await self.session.aclose()
+        self.osascript.close()
 
     def update_status(self, message: str) -> None:
         self.query_one("#status", Static).update(message)
 
-    def update_preview(self, preview_path: Path | str | None, details: str) -> None:
+    def update_preview(
+        self, preview: PILImage.Image | Path | str | None, details: str
+    ) -> None:
         image_widget = self.query_one("#preview-text", Image)
-        if preview_path:
-            image_widget.image = preview_path
+        if preview is not None:
+            image_widget.image = preview
         else:
             image_widget.image = None
         self.query_one("#details", Static).update(details)
@@ -283,6 +873,9 @@ class WallsApp(App):
         if not self.search_query:
             self.update_status("Enter a search term first.")
             return
+        if self.filtered_view:
+            self.restart_filtered_search()
+            return
         if self.current_page >= self.last_page:
             self.update_status(f"Already at last page ({self.last_page}).")
             return
@@ -293,6 +886,9 @@ class WallsApp(App):
         if not self.search_query:
             self.update_status("Enter a search term first.")
             return
+        if self.filtered_view:
+            self.restart_filtered_search()
+            return
         if self.current_page <= 1:
             self.update_status("Already at first page.")
             return
@@ -300,16 +896,19 @@ class WallsApp(App):
         self.start_search()
 
     def action_next_cache_item(self) -> None:
-        if not self.cached_wallpapers:
+        if not self.cached_entries:
             return
-        if self.current_cache_index < len(self.cached_wallpapers) - 1:
+        loaded = len(self.cached_entries)
+        if self.current_cache_index == loaded - 1 and loaded < self.cached_total:
+            self.cached_entries += self.cache.cached_entries(CACHE_PAGE_SIZE, loaded)
+        if self.current_cache_index < len(self.cached_entries) - 1:
             self.current_cache_index += 1
             self.update_cache_view()
         else:
             self.update_status("At last cached wallpaper.")
 
     def action_previous_cache_item(self) -> None:
-        if not self.cached_wallpapers:
+        if not self.cached_entries:
             return
         if self.current_cache_index > 0:
             self.current_cache_index -= 1
@@ -318,9 +917,42 @@ class WallsApp(App):
             self.update_status("At first cached wallpaper.")
 
     def action_purity(self) -> None:
-        from constants import purity_state_mapping as next_state
+        self.purity_index = (self.purity_index + 1) % len(PURITY_CYCLE)
+        self.purity = PURITY_CYCLE[self.purity_index]
+        enabled = [level for level, on in _purity_flags(self.purity).items() if on]
+        self.update_status(f"Purity filter: {', '.join(enabled)}.")
+        if not self.search_query or self.cache_mode:
+            return
+
+        # A narrower filter can be applied to the page we already have; a
+        # wider one needs results the API has not sent yet.
+        if _purity_narrows(self.purity, self.page_purity):
+            visible = [
+                wallpaper
+                for wallpaper in self.page_results
+                if _purity_matches(wallpaper.purity, self.purity)
+            ]
+            if visible:
+                # The narrower query paginates differently, so this is not a
+                # page of it; the next page move starts it from page 1. A
+                # search still running for the old filter must not replace it.
+                self.workers.cancel_group(self, "search")
+                self.workers.cancel_group(self, "page-lookahead")
+                source_page = self.current_page
+                self.show_results(visible, {})
+                self.filtered_view = True
+                self.update_status(
+                    f"Showing {len(visible)} results filtered from "
+                    f"page {source_page}."
+                )
+                return
+        self.current_page = 1
+        self.start_search()
 
-        self.purity = next_state[self.purity]
+    def restart_filtered_search(self) -> None:
+        self.filtered_view = False
+        self.current_page = 1
+        self.start_search()
 
     def action_toggle_cache_mode(self) -> None:
         self.cache_mode = not self.cache_mode
@@ -344,52 +976,33 @@ class WallsApp(App):
         self.list_cached_wallpapers()
 
     def list_cached_wallpapers(self) -> None:
-        if not FULL_DIR.exists():
-            self.update_status("No cached wallpapers found.")
-            return
-
-        cached_files = list(FULL_DIR.iterdir())
-        if not cached_files:
-            self.update_status("No cached wallpapers found.")
-            return
-
-        self.cached_wallpapers = []
-        for file_path in sorted(
-            cached_files, key=lambda p: p.stat().st_mtime, reverse=True
-        ):
-            identifier = file_path.stem
-            cached_wallpaper = Wallpaper(
-                identifier=identifier,
-                thumb_url=str(file_path),
-                full_url=str(file_path),
-                resolution="",
-                category="cached",
-                purity="sfw",
-                file_type=file_path.suffix,
-            )
-            self.cached_wallpapers.append(cached_wallpaper)
-
-        if self.cached_wallpapers:
+        self.cached_total = self.cache.cached_count()
+        self.cached_entries = self.cache.cached_entries(CACHE_PAGE_SIZE)
+        if self.cached_entries:
             self.current_cache_index = 0
             self.update_cache_view()
             self.update_status(
-                f"Loaded {len(self.cached_wallpapers)} cached wallpapers. "
+                f"Loaded {self.cached_total} cached wallpapers. "
                 f"Use left/right arrows to navigate, Enter to set wallpaper."
             )
         else:
             self.update_status("No cached wallpapers found.")
 
+    def current_cached_wallpaper(self) -> Wallpaper:
+        entry = self.cached_entries[self.current_cache_index]
+        return self.cache.cached_wallpaper(entry)
+
     def update_cache_view(self) -> None:
-        if not self.cached_wallpapers:
+        if not self.cached_entries:
             self.query_one("#cache-preview", Image).image = None
             self.query_one("#cache-info", Static).update("")
             return
 
-        wallpaper = self.cached_wallpapers[self.current_cache_index]
+        wallpaper = self.current_cached_wallpaper()
         self.query_one("#cache-preview", Image).image = wallpaper.full_url
 
-        details = format_details(wallpaper)
-        info = f"{details}\n\n[{self.current_cache_index + 1}/{len(self.cached_wallpapers)}]"
+        details = wallpaper.details
+        info = f"{details}\n\n[{self.current_cache_index + 1}/{self.cached_total}]"
         self.query_one("#cache-info", Static).update(info)
 
     def on_input_submitted(self, message: Input.Submitted) -> None:
@@ -403,23 +1016,80 @@ class WallsApp(App):
 
     def on_key(self, event: events.Key) -> None:
         if self.cache_mode and event.key == "enter":
-            if self.cached_wallpapers:
-                wallpaper = self.cached_wallpapers[self.current_cache_index]
-                self.set_cached_wallpaper(wallpaper)
-
-    def on_list_view_highlighted(self, message: ListView.Highlighted) -> None:
-        if not message.item or not isinstance(message.item, WallItem):
-            self.update_preview(None, "")
+            if self.cached_entries:
+                self.set_cached_wallpaper(self.current_cached_wallpaper())
+
+    def on_option_list_option_highlighted(
+        self, message: OptionList.OptionHighlighted
+    ) -> None:
+        index = self._result_index.get(message.option_id or "")
+        if index is None:
+            # Highlight from a list that has since been replaced.
             return
-        wallpaper = message.item.wallpaper
-        self.load_preview(wallpaper)
+        self.cancel_pending_preview()
+        wallpaper = self.results[index]
+        if not self.cache_mode:
+            upcoming = self.results[index + 1 : index + 1 + PREFETCH_LOOKAHEAD]
+            if upcoming:
+                self.prefetch_neighbors(upcoming)
+        if wallpaper.large_thumb_url and not self.cache_mode:
+            cached_thumbnail = self.cache.cached_thumbnail(wallpaper, large=True)
+            if cached_thumbnail is not None:
+                self.update_preview(cached_thumbnail, wallpaper.details)
+                return
+        if wallpaper.thumb_url and not self.cache_mode:
+            cached_thumbnail = self.cache.cached_thumbnail(wallpaper)
+            if cached_thumbnail is not None:
+                self.update_preview(cached_thumbnail, wallpaper.details)
+                self._schedule_large_preview(wallpaper)
+                return
+        # Show the details right away, but only fetch the image once the user
+        # pauses on a row, not for every row scrolled past.
+        self.update_preview(None, wallpaper.details)
+        self._pending_highlight = wallpaper
+        self._preview_timer = self.set_timer(PREVIEW_DEBOUNCE, self._fire_preview)
+
+    def cancel_pending_preview(self) -> None:
+        if self._preview_timer is not None:
+            self._preview_timer.stop()
+            self._preview_timer = None
+        self._pending_highlight = None
+        self.workers.cancel_group(self, "preview")
+
+    def _fire_preview(self) -> None:
+        wallpaper = self._pending_highlight
+        self._preview_timer = None
+        self._pending_highlight = None
+        if wallpaper is not None:
+            self.load_preview(wallpaper)
+
+    def _schedule_large_preview(self, wallpaper: Wallpaper) -> None:
+        # The small thumbnail is on screen; swap in the larger one only if
+        # the user lingers. Reuses the preview timer so a new highlight
+        # cancels it.
+        if not wallpaper.large_thumb_url or (
+            wallpaper.large_thumb_url == wallpaper.thumb_url
+        ):
+            return
+        self._preview_timer = self.set_timer(
+            LARGE_PREVIEW_DWELL, lambda: self._fire_large_preview(wallpaper)
+        )
 
-    def on_list_view_selected(self, message: ListView.Selected) -> None:
-        if isinstance(message.item, WallItem):
-            if self.cache_mode:
-                self.set_cached_wallpaper(message.item.wallpaper)
-            else:
-                self.set_wallpaper(message.item.wallpaper)
+    def _fire_large_preview(self, wallpaper: Wallpaper) -> None:
+        self._preview_timer = None
+        self.load_large_preview(wallpaper)
+
+    def on_option_list_option_selected(
+        self, message: OptionList.OptionSelected
+    ) -> None:
+        index = self._result_index.get(message.option_id or "")
+        if index is None:
+            return
+        wallpaper = self.results[index]
+        if self.cache_mode:
+            self.set_cached_wallpaper(wallpaper)
+        else:
+            self.set_wallpaper(wallpaper)
 
     def start_search(self) -> None:
         self.update_status(
@@ -429,11 +1099,17 @@ class WallsApp(App):
 
     def show_results(self, results: list[Wallpaper], meta: dict[str, Any]) -> None:
         self.results = results
-        list_view = self.query_one("#results", ListView)
-        list_view.clear()
-        list_view.extend(WallItem(result) for result in results)
+        self._result_index = {
+            result.identifier: index for index, result in enumerate(results)
+        }
+        option_list = self.query_one("#results", OptionList)
+        option_list.clear_options()
+        # Build every option up front so the list is filled in one pass.
+        options = [Option(result.label, id=result.identifier) for result in results]
+        option_list.add_options(options)
         if results:
-            list_view.index = 0
+            option_list.highlighted = 0
+            self.prefetch_thumbnails(results[:PREFETCH_WINDOW])
         else:
             self.update_preview(None, "")
 
@@ -455,25 +1131,62 @@ class WallsApp(App):
     def show_error(self, message: str) -> None:
         self.update_status(f"Error: {message}")
 
-    @work(thread=True, exclusive=True, group="search")
-    def search_wallpapers(self, query: str, page: int) -> None:
+    @work(exclusive=True, group="search")
+    async def search_wallpapers(self, query: str, page: int) -> None:
+        purity = self.purity
+        key = (query, purity, page)
+        cached = self._page_cache.get(key)
+        if cached is not None:
+            self._page_cache.move_to_end(key)
+            results, meta = cached
+        else:
+            try:
+                results, meta = await self.client.search(
+                    self.session, query, purity, page
+                )
+            except WallhavenError as exc:
+                self.show_error(str(exc))
+                return
+            self._remember_page(key, results, meta)
+        if purity != self.purity:
+            # The filter changed while this page was loading.
+            return
+        self.page_results = results
+        self.page_purity = purity
+        self.filtered_view = False
+        self.show_results(results, meta)
+        if page < self.last_page:
+            self.prefetch_page(query, purity, page + 1)
+
+    @work(exclusive=True, group="page-lookahead")
+    async def prefetch_page(self, query: str, purity: int, page: int) -> None:
+        key = (query, purity, page)
+        if key in self._page_cache:
+            return
         try:
-            results, meta = self.client.search(query, self.purity, page)
-        except WallhavenError as exc:
-            self.call_from_thread(self.show_error, str(exc))
+            results, meta = await self.client.search(self.session, query, purity, page)
+        except WallhavenError:
             return
-        self.call_from_thread(self.show_results, results, meta)
+        self._remember_page(key, results, meta)
 
-    @work(thread=True, exclusive=True, group="preview")
-    def load_preview(self, wallpaper: Wallpaper) -> None:
+    def _remember_page(
+        self,
+        key: tuple[str, int, int],
+        results: list[Wallpaper],
+        meta: dict[str, Any],
+    ) -> None:
+        self._page_cache[key] = (results, meta)
+        self._page_cache.move_to_end(key)
+        while len(self._page_cache) > SEARCH_PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+
+    @work(exclusive=True, group="preview")
+    async def load_preview(self, wallpaper: Wallpaper) -> None:
         if not wallpaper.thumb_url:
-            self.call_from_thread(
-                self.update_preview,
-                None,
-                format_details(wallpaper),
-            )
+            self.update_preview(None, wallpaper.details)
             return
 
+        preview = None
         try:
             if self.cache_mode:
                 preview_path = Path(wallpaper.full_url)
@@ -483,75 +1196,182 @@ class WallsApp(App):
                     cached_thumbnail = None
             else:
                 thumbnail_path = self.cache.thumbnail_path(wallpaper)
-                cached_thumbnail = self.cache.download(
-                    wallpaper.thumb_url, thumbnail_path
+                cached_thumbnail = await self.cache.download(
+                    self.session, wallpaper.thumb_url, thumbnail_path
+                )
+            if cached_thumbnail is not None:
+                preview = await asyncio.get_running_loop().run_in_executor(
+                    IMAGE_EXECUTOR, _decode_image, cached_thumbnail
                 )
-            details = format_details(wallpaper)
+            details = wallpaper.details
         except WallhavenError as exc:
-            cached_thumbnail = None
-            details = f"{format_details(wallpaper)}\nError: {exc}"
+            details = f"{wallpaper.details}\nError: {exc}"
 
-        self.call_from_thread(self.update_preview, cached_thumbnail, details)
+        self.update_preview(preview, details)
+        if preview is not None and not self.cache_mode:
+            self._schedule_large_preview(wallpaper)
 
-    @work(thread=True, exclusive=True, group="wallpaper")
-    def set_wallpaper(self, wallpaper: Wallpaper) -> None:
-        self.call_from_thread(
-            self.update_status, f"Downloading {wallpaper.identifier}..."
-        )
+    @work(exclusive=True, group="preview")
+    async def load_large_preview(self, wallpaper: Wallpaper) -> None:
+        try:
+            large_path = await self.cache.download(
+                self.session,
+                wallpaper.large_thumb_url,
+                self.cache.large_thumbnail_path(wallpaper),
+            )
+            preview = await asyncio.get_running_loop().run_in_executor(
+                IMAGE_EXECUTOR, _decode_image, large_path
+            )
+        except WallhavenError:
+            # The small thumbnail is already showing; keep it.
+            return
+        self.update_preview(preview, wallpaper.details)
+
+    @work(exclusive=True, group="prefetch")
+    async def prefetch_thumbnails(self, results: list[Wallpaper]) -> None:
+        await self._prefetch(results)
+
+    # Exclusive in its own group: each highlight replaces the previous
+    # lookahead, and it waits out the preview debounce first so rows that are
+    # only scrolled past never start a download.
+    @work(exclusive=True, group="lookahead")
+    async def prefetch_neighbors(self, results: list[Wallpaper]) -> None:
+        await asyncio.sleep(PREVIEW_DEBOUNCE)
+        await self._prefetch(results)
+
+    async def _prefetch(self, results: list[Wallpaper]) -> None:
+        downloads = []
+        for wallpaper in results:
+            if not wallpaper.thumb_url:
+                continue
+            thumbnail_path = self.cache.thumbnail_path(wallpaper)
+            if self.cache.is_cached(thumbnail_path):
+                continue
+            downloads.append(
+                self.cache.prefetch(self.session, wallpaper.thumb_url, thumbnail_path)
+            )
+        # Failures are ignored here; load_preview reports them when highlighted.
+        await asyncio.gather(*downloads, return_exceptions=True)
+
+    @work(exclusive=True, group="wallpaper")
+    async def set_wallpaper(self, wallpaper: Wallpaper) -> None:
+        self._wallpaper_token = token = object()
+        self.update_status(f"Downloading {wallpaper.identifier}...")
         try:
-            full_path = self.cache.full_path(wallpaper)
-            cached_full = self.cache.download(wallpaper.full_url, full_path)
-            self._set_macos_wallpaper(cached_full)
+            cached_full = await self.cache.download_full(self.session, wallpaper)
+            if token is not self._wallpaper_token:
+                return
+            applied = await asyncio.to_thread(
+                self._apply_wallpaper, cached_full, token
+            )
         except WallhavenError as exc:
-            self.call_from_thread(self.show_error, str(exc))
+            self.show_error(str(exc))
             return
         except Exception as exc:
-            self.call_from_thread(self.show_error, f"Wallpaper set failed: {exc}")
+            self.show_error(f"Wallpaper set failed: {exc}")
             return
 
-        self.call_from_thread(
-            self.update_status, f"Wallpaper set to {wallpaper.identifier}."
-        )
+        if applied and token is self._wallpaper_token:
+            self.update_status(f"Wallpaper set to {wallpaper.identifier}.")
+        self.trim_cache()
 
-    @work(thread=True, exclusive=True, group="wallpaper")
-    def set_cached_wallpaper(self, wallpaper: Wallpaper) -> None:
-        self.call_from_thread(
-            self.update_status,
-            f"Setting wallpaper from cache: {wallpaper.identifier}...",
-        )
+    def trim_cache(self) -> None:
+        # One sweep at a time; a request made during a sweep runs another
+        # once it finishes instead of cancelling it.
+        if self._trimming:
+            self._trim_again = True
+            return
+        self._trimming = True
+        self._run_trim()
+
+    @work(group="trim")
+    async def _run_trim(self) -> None:
+        try:
+            while True:
+                self._trim_again = False
+                # The thread keeps deleting files even if this worker is
+                # cancelled, so forget() runs from a callback on the sweep
+                # itself rather than after the await.
+                sweep = asyncio.ensure_future(asyncio.to_thread(self.cache.trim))
+                sweep.add_done_callback(self._forget_evicted)
+                try:
+                    await asyncio.shield(sweep)
+                except OSError:
+                    return
+                if not self._trim_again:
+                    return
+        finally:
+            self._trimming = False
+
+    def _forget_evicted(self, sweep: asyncio.Future[list[Path]]) -> None:
+        if sweep.cancelled():
+            return
+        exc = sweep.exception()
+        if exc is not None:
+            self.show_error(f"Cache cleanup failed: {exc}")
+            return
+        self.cache.forget(sweep.result())
+
+    @work(exclusive=True, group="wallpaper")
+    async def set_cached_wallpaper(self, wallpaper: Wallpaper) -> None:
+        self._wallpaper_token = token = object()
+        self.update_status(f"Setting wallpaper from cache: {wallpaper.identifier}...")
         try:
             full_path = Path(wallpaper.full_url)
             if not full_path.exists():
                 raise WallhavenError(f"Cached file not found: {full_path}")
-            self._set_macos_wallpaper(full_path)
+            applied = await asyncio.to_thread(self._apply_wallpaper, full_path, token)
         except WallhavenError as exc:
-            self.call_from_thread(self.show_error, str(exc))
+            self.show_error(str(exc))
             return
         except Exception as exc:
-            self.call_from_thread(self.show_error, f"Wallpaper set failed: {exc}")
+            self.show_error(f"Wallpaper set failed: {exc}")
             return
 
-        self.call_from_thread(
-            self.update_status, f"Wallpaper set to {wallpaper.identifier} (from cache)."
-        )
+        if applied and token is self._wallpaper_token:
+            self.update_status(f"Wallpaper set to {wallpaper.identifier} (from cache).")
 
-    @staticmethod
-    def _set_macos_wallpaper(path: Path) -> None:
+    def _apply_wallpaper(self, path: Path, token: object) -> bool:
+        # Runs on a worker thread. Cancelling the worker task does not stop
+        # the thread, so a superseded request must bail out here instead of
+        # overwriting a newer wallpaper.
+        with self._wallpaper_lock:
+            if token is not self._wallpaper_token:
+                return False
+            self._set_macos_wallpaper(path)
+            return True
+
+    def _set_macos_wallpaper(self, path: Path) -> None:
         if sys.platform != "darwin":
             raise WallhavenError("Wallpaper setting is supported on macOS only.")
-        safe_path = str(path).replace('"', '\\"')
-        script = (
-            'tell application "System Events"\n'
-            "repeat with desktop_item in desktops\n"
-            f'set picture of desktop_item to POSIX file "{safe_path}"\n'
-            "end repeat\n"
-            "end tell"
-        )
-        subprocess.run(["osascript", "-e", script], check=True)
+        if NSWorkspace is not None:
+            url = NSURL.fileURLWithPath_(str(path))
+            workspace = NSWorkspace.sharedWorkspace()
+            for screen in NSScreen.screens():
+                ok, error = workspace.setDesktopImageURL_forScreen_options_error_(
+                    url, screen, {}, None
+                )
+                if not ok:
+                    raise WallhavenError(
+                        f"Wallpaper set failed: {error.localizedDescription()}"
+                    )
+            return
+
+        safe_path = str(path).replace("\\", "\\\\").replace('"', '\\"')
+        self.osascript.run(f'setWall("{safe_path}")')
+
+
+def warm_dns() -> None:
+    for host in WALLHAVEN_HOSTS:
+        try:
+            socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+        except OSError:
+            pass
 
 
 def main() -> None:
     load_dotenv()
+    threading.Thread(target=warm_dns, daemon=True).start()
     api_key = os.getenv("WALLHAVEN_API_KEY")
     client = WallhavenClient(api_key)
     cache = CacheManager()